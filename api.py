@@ -4,14 +4,14 @@ from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Backgroun
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from backend.rag import rag_agent
-from backend.data_models import Prompt
-from backend.document_service import ingest_single_document, list_documents, delete_document, reset_knowledge_base
-from backend.constants import DATA_PATH, VECTOR_DATABASE_PATH
+from backend.data_models import Prompt, embedding_model
+from backend.document_service import ingest_single_document, list_documents, delete_document, reset_knowledge_base, read_text_slice, migrate_vector_db_table, get_vector_db_table
+from backend.snapshot_service import export_knowledge_base, import_knowledge_base
+from backend.constants import DATA_PATH, SNAPSHOT_PATH
 from backend import auth
 from backend.auth import init_db, create_access_token, authenticate_user, get_current_user
 from pathlib import Path
 import shutil
-import lancedb
 import asyncio
 
 class RegisterModel(BaseModel):
@@ -27,6 +27,10 @@ app = FastAPI()
 
 processing_lock = asyncio.Lock()
 
+# The best-ranked chunks are widened with neighbouring text from the same document
+NEIGHBOR_CONTEXT_TOP_K = 5
+NEIGHBOR_CONTEXT_BYTES = 500
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -38,26 +42,32 @@ app.add_middleware(
 @app.on_event("startup")
 def startup_event():
     init_db()
+    migrate_vector_db_table()
 
 @app.get("/")
 def root():
     return {"status": "ok", "message": "RAG API is running"}
 
+def context_snippet(result: dict, rank: int) -> str:
+    window = NEIGHBOR_CONTEXT_BYTES if rank < NEIGHBOR_CONTEXT_TOP_K else 0
+    snippet = read_text_slice(result['filepath'], result['start_offset'], result['end_offset'], window=window)
+    return snippet[:4000]
+
 @app.post('/rag/query')
 async def query_documentation(query: Prompt, current_user: dict = Depends(get_current_user)):
     async with processing_lock:
         try:
-            vector_db = lancedb.connect(uri=VECTOR_DATABASE_PATH)
-            table = vector_db.open_table('articles_chunks')
+            table = get_vector_db_table()
 
-            results = table.search(query=query.prompt).where(f"owner_id = '{current_user['id']}'").limit(50).to_list()
+            query_vector = embedding_model.compute_query_embeddings(query.prompt)[0]
+            results = table.search(query_vector).where(f"owner_id = '{current_user['id']}'").limit(50).to_list()
 
             if not results:
                 raise HTTPException(status_code=404, detail="No documents found for this user")
 
             combined = "\n\n".join([
-                f"Document: {r.get('filename')}\nSource Path: {r.get('filepath')}\nContent Snippet:\n{ (r.get('content') or '')[:4000] }"
-                for r in results
+                f"Document: {r.get('filename')} (page {r.get('page')})\nSource Path: {r.get('filepath')}\nContent Snippet:\n{context_snippet(r, rank)}"
+                for rank, r in enumerate(results)
             ])
 
             prompt_with_context = (
@@ -131,7 +141,7 @@ async def get_documents(current_user: dict = Depends(get_current_user)):
 
 @app.delete('/rag/documents/{doc_id}')
 async def remove_document(doc_id: str, current_user: dict = Depends(get_current_user)):
-    result = delete_document(doc_id, owner_id=str(current_user['id']))
+    result = delete_document(doc_id, owner_id=str(current_user['id']), user_dir=DATA_PATH / current_user['username'])
     if result['success']:
         return result
     else:
@@ -139,9 +149,37 @@ async def remove_document(doc_id: str, current_user: dict = Depends(get_current_
 
 @app.post('/rag/reset')
 async def reset_database(current_user: dict = Depends(get_current_user)):
-    result = reset_knowledge_base(owner_id=str(current_user['id']))
+    async with processing_lock:
+        result = await asyncio.to_thread(
+            reset_knowledge_base, str(current_user['id']), DATA_PATH / current_user['username']
+        )
     if result['success']:
         return result
     else:
         print(f"RESET ERROR: {result['message']}")
-        raise HTTPException(status_code=500, detail=result['message'])
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=result['message'])
+
+@app.post('/rag/snapshot/export')
+async def export_snapshot(current_user: dict = Depends(get_current_user)):
+    async with processing_lock:
+        result = await asyncio.to_thread(
+            export_knowledge_base, str(current_user['id']), SNAPSHOT_PATH / current_user['username']
+        )
+    if result['success']:
+        return result
+    else:
+        raise HTTPException(status_code=500, detail=result['message'])
+
+@app.post('/rag/snapshot/import')
+async def import_snapshot(current_user: dict = Depends(get_current_user)):
+    snapshot_dir = SNAPSHOT_PATH / current_user['username']
+    if not snapshot_dir.exists():
+        raise HTTPException(status_code=404, detail="No snapshot found for this user")
+    async with processing_lock:
+        result = await asyncio.to_thread(
+            import_knowledge_base, str(current_user['id']), DATA_PATH / current_user['username'], snapshot_dir
+        )
+    if result['success']:
+        return result
+    else:
+        raise HTTPException(status_code=500, detail=result['message'])
@@ -12,3 +12,6 @@ if not SECRET_KEY:
 
 DATA_PATH = Path(__file__).parents[1] / "data"
 VECTOR_DATABASE_PATH = Path(__file__).parents[1] / "knowledge_base"
+
+# Per-user knowledge base snapshots (Lance datasets), kept outside DATA_PATH's per-user directories
+SNAPSHOT_PATH = Path(__file__).parents[1] / "snapshots"
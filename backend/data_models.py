@@ -4,18 +4,21 @@ from lancedb.pydantic import LanceModel, Vector
 from dotenv import load_dotenv
 
 load_dotenv()
-embedding_model = get_registry().get("sentence-transformers").create(name="all-MiniLM-L6-v2", device="cpu")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+embedding_model = get_registry().get("sentence-transformers").create(name=EMBEDDING_MODEL_NAME, device="cpu")
 
 EMBEDDING_DIM = 384
 
 class ChunkArticle(LanceModel):
     doc_id: str
     chunk_id: str
-    filepath: str
+    filepath: str = Field(description="Extracted-text file the offsets point into")
     filename: str
     owner_id: str = Field(description="ID of the user who uploaded the document")
-    content: str = embedding_model.SourceField()
-    embedding: Vector(EMBEDDING_DIM) = embedding_model.VectorField()
+    page: int = Field(description="1-based PDF page the chunk starts on, 0 if unknown")
+    start_offset: int = Field(description="Byte offset of the chunk start in the UTF-8 text file")
+    end_offset: int = Field(description="Byte offset of the chunk end in the UTF-8 text file")
+    embedding: Vector(EMBEDDING_DIM)
 
 class Prompt(BaseModel):
     prompt: str = Field(description= 'prompt from user, if empty consider it as missing')
\ No newline at end of file
@@ -1,31 +1,66 @@
+import mmap
+from bisect import bisect_right
 from datetime import timedelta
 from pathlib import Path
 
+import lance
 import lancedb
+import pyarrow as pa
 from pypdf import PdfReader
 
 from backend.constants import VECTOR_DATABASE_PATH, DATA_PATH
 from backend.data_models import ChunkArticle
 
+# Chunk stride (chunk_size - overlap) used when chunks still stored their content
+LEGACY_CHUNK_STEP = 800
 
-def extract_text_from_pdf(pdf_path: Path) -> str:
+
+def extract_text_from_pdf(pdf_path: Path) -> tuple[str, list[int]]:
+    """Return the document text and the character offset at which each page starts."""
     reader = PdfReader(pdf_path)
-    all_text = ''
+    parts = []
+    page_starts = []
+    length = 0
     for page in reader.pages:
+        page_starts.append(length)
         text = page.extract_text()
         if text:
-            all_text += text + '\n'
-    return all_text
+            parts.append(text + '\n')
+            length += len(text) + 1
+    return ''.join(parts), page_starts
 
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
+def chunk_spans(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[tuple[int, int]]:
     if not text:
         return []
-    chunks = []
     step = chunk_size - overlap
-    for i in range(0, len(text), step):
-        chunks.append(text[i : i + chunk_size])
-    return chunks
+    return [(i, min(i + chunk_size, len(text))) for i in range(0, len(text), step)]
+
+
+def _byte_offsets(text: str, char_offsets: list[int]) -> list[int]:
+    """Map sorted character offsets to byte offsets in the UTF-8 encoding of text."""
+    offsets = []
+    prev_char = 0
+    prev_byte = 0
+    for char_offset in char_offsets:
+        prev_byte += len(text[prev_char:char_offset].encode('utf-8'))
+        prev_char = char_offset
+        offsets.append(prev_byte)
+    return offsets
+
+
+def read_text_slice(filepath: str | Path, start: int, end: int, window: int = 0) -> str:
+    """Read bytes [start - window, end + window) of an extracted-text file via mmap.
+
+    A non-zero window pulls in neighbouring context around the chunk; partial
+    UTF-8 sequences at the widened edges are dropped.
+    """
+    try:
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[max(start - window, 0) : min(end + window, len(mm))]
+    except (OSError, ValueError):
+        return ''
+    return data.decode('utf-8', errors='ignore')
 
 
 def _safe_delete_path(path: Path) -> None:
@@ -59,11 +94,10 @@ def ingest_single_document(pdf_path: Path, owner_id: str) -> dict:
 
     try:
         table = get_vector_db_table()
-        content = extract_text_from_pdf(pdf_path)
-
+        content, page_starts = extract_text_from_pdf(pdf_path)
 
         txt_path = pdf_path.with_suffix('.txt')
-        txt_path.write_text(content, encoding="utf-8")
+        txt_path.write_text(content, encoding="utf-8", newline='')
 
         doc_id = pdf_path.stem
 
@@ -71,19 +105,23 @@ def ingest_single_document(pdf_path: Path, owner_id: str) -> dict:
 
         table.compact_files()
 
-        text_chunks = chunk_text(content)
+        spans = chunk_spans(content)
+        text_chunks = [content[start:end] for start, end in spans]
 
         embeddings = _compute_embeddings(text_chunks)
-            
+
+        byte_starts = _byte_offsets(content, [start for start, _ in spans])
         chunk_records = []
-        for i, chunk in enumerate(text_chunks):
+        for i, (start, end) in enumerate(spans):
             chunk_records.append({
                 'doc_id': doc_id,
                 'chunk_id': f"{doc_id}_chunk_{i}",
                 'filepath': str(txt_path),
                 'filename': pdf_path.stem,
-                'content': chunk,
                 'owner_id': owner_id,
+                'page': bisect_right(page_starts, start),
+                'start_offset': byte_starts[i],
+                'end_offset': byte_starts[i] + len(text_chunks[i].encode('utf-8')),
                 'embedding': embeddings[i]
             })
 
@@ -106,15 +144,113 @@ def ingest_single_document(pdf_path: Path, owner_id: str) -> dict:
         }
 
 
+def _legacy_chunk_index(chunk_id: str) -> int:
+    return int(chunk_id.rsplit('_', 1)[1])
+
+
+def _rebuild_legacy_text(dataset: lance.LanceDataset, filepath: str) -> str:
+    """Reassemble a document's text from its overlapping legacy chunks."""
+    quoted = filepath.replace("'", "''")
+    rows = dataset.to_table(columns=["chunk_id", "content"], filter=f"filepath = '{quoted}'").to_pylist()
+    rows.sort(key=lambda row: _legacy_chunk_index(row["chunk_id"]))
+    if not rows:
+        return ''
+    return ''.join(row["content"][:LEGACY_CHUNK_STEP] for row in rows[:-1]) + rows[-1]["content"]
+
+
+def _restore_legacy_text_files(dataset: lance.LanceDataset) -> None:
+    for filepath in set(dataset.to_table(columns=["filepath"])["filepath"].to_pylist()):
+        txt_path = Path(filepath)
+        if not txt_path.exists():
+            txt_path.parent.mkdir(parents=True, exist_ok=True)
+            txt_path.write_text(_rebuild_legacy_text(dataset, filepath), encoding="utf-8", newline='')
+
+
+def _legacy_provenance_udf() -> lance.udf.BatchUDF:
+    schema = ChunkArticle.to_arrow_schema()
+    output_schema = pa.schema([schema.field("page"), schema.field("start_offset"), schema.field("end_offset")])
+    documents = {}
+
+    def load(filepath: str) -> tuple[list[int], list[int]]:
+        if filepath not in documents:
+            txt_path = Path(filepath)
+            text = txt_path.read_bytes().decode('utf-8')
+
+            # Page boundaries are only trusted when the PDF still extracts to the same text
+            page_starts = []
+            pdf_path = txt_path.with_suffix('.pdf')
+            if pdf_path.exists():
+                pdf_text, pdf_page_starts = extract_text_from_pdf(pdf_path)
+                if pdf_text == text:
+                    page_starts = pdf_page_starts
+
+            byte_starts = _byte_offsets(text, list(range(0, len(text), LEGACY_CHUNK_STEP)))
+            documents[filepath] = (page_starts, byte_starts)
+        return documents[filepath]
+
+    @lance.batch_udf(output_schema=output_schema)
+    def provenance(batch: pa.RecordBatch) -> pa.RecordBatch:
+        columns = {"page": [], "start_offset": [], "end_offset": []}
+        for chunk_id, filepath, content in zip(
+            batch["chunk_id"].to_pylist(), batch["filepath"].to_pylist(), batch["content"].to_pylist()
+        ):
+            index = _legacy_chunk_index(chunk_id)
+            page_starts, byte_starts = load(filepath)
+            start = byte_starts[index] if index < len(byte_starts) else 0
+            columns["page"].append(bisect_right(page_starts, index * LEGACY_CHUNK_STEP))
+            columns["start_offset"].append(start)
+            columns["end_offset"].append(start + len(content.encode('utf-8')))
+        return pa.RecordBatch.from_pydict(columns, schema=output_schema)
+
+    return provenance
+
+
+def _needs_provenance_migration(schema: pa.Schema) -> bool:
+    return (
+        "start_offset" not in schema.names
+        or "content" in schema.names
+        or b"embedding_functions" in (schema.metadata or {})
+    )
+
+
+def _migrate_to_chunk_provenance(table) -> None:
+    """Upgrade a table that stored full chunk content, in place and without re-embedding.
+
+    Legacy chunk i of a document started at character i * LEGACY_CHUNK_STEP of its
+    .txt file, so page and byte offsets are derived from chunk_id and the text.
+    Each step is skipped once done, so a worker that loses a race with another
+    worker only has to confirm the table ended up migrated.
+    """
+    dataset = table.to_lance()
+    try:
+        if "start_offset" not in dataset.schema.names:
+            # The UDF runs inside lance and cannot query the dataset itself
+            _restore_legacy_text_files(dataset)
+            dataset.add_columns(_legacy_provenance_udf(), read_columns=["chunk_id", "filepath", "content"])
+        if "content" in dataset.schema.names:
+            dataset.drop_columns(["content"])
+        if b"embedding_functions" in (dataset.schema.metadata or {}):
+            # The legacy embedding function pointed at the dropped content column
+            dataset.update_schema_metadata({"embedding_functions": None})
+    except Exception:
+        if _needs_provenance_migration(lance.dataset(dataset.uri).schema):
+            raise
+
+
 def get_vector_db_table():
     vector_db = lancedb.connect(uri=VECTOR_DATABASE_PATH)
 
-    try:
-        table = vector_db.open_table("articles_chunks")
-    except Exception:
-        table = vector_db.create_table("articles_chunks", schema=ChunkArticle, mode="overwrite")
+    if "articles_chunks" not in vector_db.table_names():
+        return vector_db.create_table("articles_chunks", schema=ChunkArticle, exist_ok=True)
 
-    return table
+    return vector_db.open_table("articles_chunks")
+
+
+def migrate_vector_db_table() -> None:
+    """Bring a table from before chunk provenance up to date; run once at startup."""
+    table = get_vector_db_table()
+    if _needs_provenance_migration(table.schema):
+        _migrate_to_chunk_provenance(table)
 
 
 def list_documents(owner_id: str) -> list:
@@ -129,20 +265,13 @@ def list_documents(owner_id: str) -> list:
         return []
 
 
-def delete_document(doc_id: str, owner_id: str) -> dict:
+def delete_document(doc_id: str, owner_id: str, user_dir: Path) -> dict:
     try:
         table = get_vector_db_table()
 
-        # Get filepaths before deletion
-        try:
-            df = table.to_pandas()
-            matches = df[(df['doc_id'] == doc_id) & (df['owner_id'] == owner_id)]
-            if not matches.empty:
-                txt_path = Path(matches.iloc[0]['filepath'])
-                _safe_delete_path(txt_path)
-                _safe_delete_path(txt_path.with_suffix('.pdf'))
-        except Exception:
-            pass
+        txt_path = user_dir / f"{doc_id}.txt"
+        _safe_delete_path(txt_path)
+        _safe_delete_path(txt_path.with_suffix('.pdf'))
 
         table.delete(f"doc_id = '{doc_id}' AND owner_id = '{owner_id}'")
         table.compact_files()
@@ -158,20 +287,18 @@ def delete_document(doc_id: str, owner_id: str) -> dict:
         }
 
 
-def reset_knowledge_base(owner_id: str) -> dict:
+def reset_knowledge_base(owner_id: str, user_dir: Path) -> dict:
     try:
         table = get_vector_db_table()
-        df = table.to_pandas()
-        user_files = set(df.loc[df['owner_id'] == owner_id, 'filepath'])
 
-        for fp in user_files:
-            txt_path = Path(fp)
-            _safe_delete_path(txt_path)
-            _safe_delete_path(txt_path.with_suffix('.pdf'))
+        rows = table.search().where(f"owner_id = '{owner_id}'").select(["doc_id"]).limit(None).to_arrow()
+        for doc_id in set(rows["doc_id"].to_pylist()):
+            txt_path = user_dir / f"{doc_id}.txt"
+            txt_path.unlink(missing_ok=True)
+            txt_path.with_suffix('.pdf').unlink(missing_ok=True)
 
-            user_dir = txt_path.parent
-            if user_dir != DATA_PATH and user_dir.exists() and not any(user_dir.iterdir()):
-                user_dir.rmdir()
+        if user_dir != DATA_PATH and user_dir.exists() and not any(user_dir.iterdir()):
+            user_dir.rmdir()
 
         table.delete(f"owner_id = '{owner_id}'")
         table.compact_files()
@@ -185,4 +312,4 @@ def reset_knowledge_base(owner_id: str) -> dict:
         return {
             "success": False,
             "message": f"Failed to reset knowledge base: {str(e)}"
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,204 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import lance
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from backend.data_models import EMBEDDING_MODEL_NAME, EMBEDDING_DIM
+from backend.document_service import get_vector_db_table
+
+SNAPSHOT_FORMAT_VERSION = "1"
+CHUNKS_DATASET = "chunks.lance"
+DOCUMENTS_DATASET = "documents.lance"
+
+DOCUMENTS_SCHEMA = pa.schema([
+    pa.field("doc_id", pa.string()),
+    pa.field("filename", pa.string()),
+    pa.field("text", pa.large_binary()),
+])
+
+
+def _snapshot_metadata() -> dict:
+    return {
+        b"snapshot_format_version": SNAPSHOT_FORMAT_VERSION.encode(),
+        b"embedding_model": EMBEDDING_MODEL_NAME.encode(),
+        b"embedding_dim": str(EMBEDDING_DIM).encode(),
+    }
+
+
+def _owner_filter(owner_id: str) -> str:
+    return f"owner_id = '{owner_id}'"
+
+
+def _document_batches(documents: pa.Table):
+    for doc in documents.to_pylist():
+        text = Path(doc["filepath"]).read_bytes()
+        yield pa.RecordBatch.from_pylist(
+            [{"doc_id": doc["doc_id"], "filename": doc["filename"], "text": text}],
+            schema=DOCUMENTS_SCHEMA,
+        )
+
+
+def _swap_directory(staging_dir: Path, target_dir: Path) -> None:
+    previous_dir = staging_dir.with_name(staging_dir.name + ".previous")
+    if target_dir.exists():
+        target_dir.rename(previous_dir)
+    staging_dir.rename(target_dir)
+    if previous_dir.exists():
+        shutil.rmtree(previous_dir)
+
+
+def export_knowledge_base(owner_id: str, snapshot_dir: Path) -> dict:
+    """Stream one owner's chunks, embeddings and extracted text into Lance datasets.
+
+    Both datasets are written to a staging directory that replaces snapshot_dir
+    only once complete, so a failed export never pairs new chunks with old text.
+    """
+    try:
+        dataset = get_vector_db_table().to_lance()
+        snapshot_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging_dir = Path(tempfile.mkdtemp(prefix=f".{snapshot_dir.name}-", dir=snapshot_dir.parent))
+
+        try:
+            reader = dataset.scanner(filter=_owner_filter(owner_id)).to_reader()
+            schema = reader.schema.with_metadata({**(reader.schema.metadata or {}), **_snapshot_metadata()})
+            chunk_count = lance.write_dataset(
+                pa.RecordBatchReader.from_batches(schema, reader),
+                staging_dir / CHUNKS_DATASET,
+            ).count_rows()
+
+            documents = dataset.to_table(
+                columns=["doc_id", "filename", "filepath"], filter=_owner_filter(owner_id)
+            ).group_by(["doc_id", "filename", "filepath"]).aggregate([])
+            lance.write_dataset(
+                pa.RecordBatchReader.from_batches(DOCUMENTS_SCHEMA, _document_batches(documents)),
+                staging_dir / DOCUMENTS_DATASET,
+            )
+
+            _swap_directory(staging_dir, snapshot_dir)
+        finally:
+            if staging_dir.exists():
+                shutil.rmtree(staging_dir)
+
+        return {
+            "success": True,
+            "chunks": chunk_count,
+            "documents": documents.num_rows,
+            "message": f"Exported knowledge base to {snapshot_dir.name}"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Failed to export knowledge base: {str(e)}"
+        }
+
+
+def _check_snapshot_schema(snapshot_schema: pa.Schema, table_schema: pa.Schema) -> None:
+    metadata = snapshot_schema.metadata or {}
+    for key, expected in _snapshot_metadata().items():
+        found = metadata.get(key)
+        if found != expected:
+            found = found.decode() if found else "missing"
+            raise ValueError(f"Snapshot {key.decode()} is {found}, expected {expected.decode()}")
+    # Column order differs between fresh tables and ones migrated in place, so compare by name
+    table_fields = {field.name: field for field in table_schema}
+    if set(snapshot_schema.names) != set(table_fields) or not all(
+        field.equals(table_fields[field.name]) for field in snapshot_schema
+    ):
+        raise ValueError("Snapshot chunk schema does not match the knowledge base schema")
+
+
+def _retarget_batch(batch: pa.RecordBatch, schema: pa.Schema, owner_id: str, user_dir: Path) -> pa.RecordBatch:
+    columns = {name: batch.column(name) for name in schema.names}
+    columns["owner_id"] = pa.array([owner_id] * batch.num_rows, pa.string())
+    columns["filepath"] = pc.binary_join_element_wise(f"{user_dir}{os.sep}", batch.column("doc_id"), ".txt", "")
+    return pa.RecordBatch.from_arrays([columns[name] for name in schema.names], schema=schema)
+
+
+def _build_import_source(
+    chunks: lance.LanceDataset, schema: pa.Schema, owner_id: str, user_dir: Path, text_sizes: dict
+) -> pa.Table:
+    """Read and retarget every snapshot chunk up front and check it against the staged texts.
+
+    The merge then reads from memory, so no read error can surface once lance
+    has started committing.
+    """
+    source = pa.Table.from_batches(
+        [_retarget_batch(batch, schema, owner_id, user_dir) for batch in chunks.to_batches()],
+        schema=schema,
+    )
+    if source["embedding"].null_count:
+        raise ValueError("Snapshot contains chunks without embeddings")
+
+    extents = source.group_by("doc_id").aggregate([("end_offset", "max")]).to_pylist()
+    for extent in extents:
+        size = text_sizes.get(extent["doc_id"])
+        if size is None:
+            raise ValueError(f"Snapshot has no text for document {extent['doc_id']}")
+        if extent["end_offset_max"] > size:
+            raise ValueError(f"Snapshot chunk offsets exceed the text of document {extent['doc_id']}")
+    return source
+
+
+def import_knowledge_base(owner_id: str, user_dir: Path, snapshot_dir: Path) -> dict:
+    """Load a snapshot into an owner's knowledge base without re-embedding.
+
+    Documents in the snapshot replace any existing documents with the same
+    doc_id; other documents the owner already has are left untouched. The
+    snapshot is read and validated in full before a single merge swaps the
+    rows in, and the text files stay under temporary names until it commits,
+    so a failed import changes nothing.
+    """
+    try:
+        chunks = lance.dataset(snapshot_dir / CHUNKS_DATASET)
+        documents = lance.dataset(snapshot_dir / DOCUMENTS_DATASET)
+        table = get_vector_db_table()
+        schema = table.schema
+        _check_snapshot_schema(chunks.schema, schema)
+        if not documents.schema.equals(DOCUMENTS_SCHEMA, check_metadata=False):
+            raise ValueError("Snapshot document schema is not supported")
+
+        user_dir.mkdir(parents=True, exist_ok=True)
+        staged = {}
+        try:
+            text_sizes = {}
+            for batch in documents.to_batches():
+                for doc_id, text in zip(batch.column("doc_id").to_pylist(), batch.column("text").to_pylist()):
+                    staged_path = user_dir / f"{doc_id}.txt.importing"
+                    staged_path.write_bytes(text)
+                    staged[doc_id] = staged_path
+                    text_sizes[doc_id] = len(text)
+
+            source = _build_import_source(chunks, schema, owner_id, user_dir, text_sizes)
+
+            if staged:
+                quoted = ", ".join(f"'{doc_id}'" for doc_id in staged)
+                (
+                    table.merge_insert(["owner_id", "chunk_id"])
+                    .when_matched_update_all()
+                    .when_not_matched_insert_all()
+                    .when_not_matched_by_source_delete(f"{_owner_filter(owner_id)} AND doc_id IN ({quoted})")
+                    .execute(source)
+                )
+                table.compact_files()
+
+            for doc_id, staged_path in staged.items():
+                staged_path.replace(user_dir / f"{doc_id}.txt")
+        finally:
+            for staged_path in staged.values():
+                staged_path.unlink(missing_ok=True)
+
+        return {
+            "success": True,
+            "chunks": source.num_rows,
+            "documents": len(staged),
+            "message": f"Imported knowledge base from {snapshot_dir.name}"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Failed to import knowledge base: {str(e)}"
+        }